@@ -0,0 +1,58 @@
+"""Compares unanchored regex search (`find_several`) with
+`find_by_prefix` and `glob` on a large bucket. Each pair returns the
+same files, the counts are checked.
+
+Directory names contain regex metacharacters, which callers have to
+escape by hand for `find_several`.
+
+Usage: python -m bench.prefix_search [number_of_files]
+
+Uses test/config_example.json, creates and drops `bench_user`.
+"""
+
+from pystorage import Server
+
+from test.utils import from_json_file
+
+import sys
+import time
+
+def timed(name, fn, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        found = len(list(fn()))
+    elapsed = (time.perf_counter() - start) / repeat
+    print("%-40s %6d files  %8.2f ms" % (name, found, elapsed * 1000))
+    return found
+
+def compare(client, regex, name, fn):
+    baseline = timed("regex " + regex,
+                     lambda: client.find_several({"$regex": regex}))
+    found = timed(name, fn)
+    assert baseline == found, "%s returned %d files, regex %d" % (name, found, baseline)
+
+def main(total):
+    server = Server(from_json_file("test/config_example.json"))
+    client = server.sign_up_new_user("bench_user", "bench_password")
+
+    try:
+        # Only `files` documents matter for search, so insert them
+        # directly instead of uploading
+        client.client_files.create_index([("filename", 1), ("uploadDate", 1)])
+        client.client_files.insert_many(
+            { "filename": "/logs(%02d)/app%06d" % (i % 12 + 1, i),
+              "length": 0, "chunkSize": 261120 }
+            for i in range(total))
+
+        compare(client, "logs\\(03\\)/",
+                "find_by_prefix /logs(03)/",
+                lambda: client.find_by_prefix("/logs(03)/"))
+        compare(client, "logs\\(03\\)/app0.*",
+                "glob /logs(03)/app0*",
+                lambda: client.glob("/logs(03)/app0*"))
+    finally:
+        client.client_files.drop()
+        server.drop_user("bench_user")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -23,3 +23,6 @@ class AlreadyExists(Exception):
 
 class ConfigError(Exception):
     """Configuration error"""
+
+class ServerUnavailable(Exception):
+    """No suitable server (e.g. primary) found in time"""
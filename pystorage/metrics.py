@@ -0,0 +1,77 @@
+"""Read routing metrics"""
+
+from pymongo import monitoring
+
+from collections import Counter
+
+import threading
+
+def _server_name(address):
+    host, port = address
+    return host if port == None else "%s:%s" % (host, port)
+
+class ReadRouting(monitoring.CommandListener, monitoring.ServerListener):
+    """Listener that counts read commands per GridFS collection, per
+    server that served them and its role (`RSPrimary`, `RSSecondary`,
+    `Standalone`, ...), plus fallbacks to primary.
+
+    pymongo calls listeners from several threads, counters are
+    guarded by a lock
+
+    """
+
+    READ_COMMANDS = ("find", "getMore")
+
+    def __init__(self):
+        self.reads = Counter()
+        self.fallbacks = Counter()
+        self.roles = {}
+        self.lock = threading.Lock()
+
+    def started(self, event):
+        if event.command_name not in self.READ_COMMANDS:
+            return
+
+        if event.command_name == "find":
+            collection = event.command["find"]
+        else:
+            collection = event.command.get("collection", "")
+
+        with self.lock:
+            role = self.roles.get(event.connection_id, "Unknown")
+            self.reads[(collection.rsplit(".", 1)[-1],
+                        _server_name(event.connection_id), role)] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def opened(self, event):
+        pass
+
+    def description_changed(self, event):
+        with self.lock:
+            self.roles[event.server_address] = event.new_description.server_type_name
+
+    def closed(self, event):
+        with self.lock:
+            self.roles.pop(event.server_address, None)
+
+    def record_fallback(self, operation):
+        """Counts a read of `operation` class retried on primary"""
+        with self.lock:
+            self.fallbacks[operation] += 1
+
+    def snapshot(self):
+        """Returns a copy of the counters:
+
+        `{"reads": {(collection, server, role): n},
+          "fallbacks": {operation: n}}`
+
+        """
+
+        with self.lock:
+            return { "reads": dict(self.reads),
+                     "fallbacks": dict(self.fallbacks) }
@@ -2,7 +2,7 @@
 
 from pystorage.storageuser import StorageClient
 from pystorage.userinfo import UserInfo
-from pystorage.utils import connection_string
+from pystorage.utils import connection_string, hosts_string, uri_options
 
 from pystorage.errors import *
 
@@ -30,9 +30,10 @@ class Server():
             raise ConfigError("Corrupted configuration provided.")
 
         self.admin = pymongo.MongoClient(
-            "mongodb://%s:%s@%s/%s" % (quote_plus(config["admin"]["username"]),
-                                       quote_plus(config["admin"]["password"]),
-                                       quote_plus(self.host), config["admin"]["default_db"]))
+            "mongodb://%s:%s@%s/%s%s" % (quote_plus(config["admin"]["username"]),
+                                         quote_plus(config["admin"]["password"]),
+                                         hosts_string(config), config["admin"]["default_db"],
+                                         uri_options(config)))
 
     def _privilege_for_db(username, config, db_suffix):
         return {
@@ -2,12 +2,14 @@
 
 from pystorage.userinfo import UserInfo
 from pystorage.utils import *
-from pystorage.errors import NoFile, AuthError
+from pystorage.metrics import ReadRouting
+from pystorage.errors import NoFile, AuthError, ServerUnavailable
 
 import pymongo
 import gridfs
 
 import os
+import re
 
 class StorageClient():
     """This class represents a client api to mongo-based storage.
@@ -29,20 +31,33 @@ class StorageClient():
     def _login(self, username, password):
         self.user = UserInfo(username, password)
         self.auth_str = connection_string(self.user, self.server.config)
-        self.client = pymongo.MongoClient(self.auth_str,
-                                          serverSelectionTimeoutMS=1)
+        self.client = pymongo.MongoClient(
+            self.auth_str,
+            serverSelectionTimeoutMS=server_selection_timeout(self.server.config),
+            event_listeners=[self.routing])
 
         try:
             self.client.server_info()
         except pymongo.errors.OperationFailure:
             raise AuthError("Wrong username or password.")
+        except pymongo.errors.ServerSelectionTimeoutError:
+            raise ServerUnavailable("Can't connect to storage server.")
 
         self.db_name = self.user.username + self.server.config["users"]["db_suffix"]
 
-        self.client_gridfs = gridfs.GridFS(self.client[self.server.config["storage_db"]],
-                                           collection=self.db_name)
-        self.client_gfsbucket = gridfs.GridFSBucket(self.client[self.server.config["storage_db"]],
+        config = self.server.config
+        metadata_db = self.client.get_database(
+            config["storage_db"], read_preference=read_preference(config, "metadata"))
+        download_db = self.client.get_database(
+            config["storage_db"], read_preference=read_preference(config, "download"))
+
+        self.client_gridfs = gridfs.GridFS(metadata_db, collection=self.db_name)
+        self.client_gfsbucket = gridfs.GridFSBucket(metadata_db,
                                                     bucket_name=self.db_name)
+        self.client_files = metadata_db[self.db_name + ".files"]
+        self.download_gfsbucket = gridfs.GridFSBucket(download_db,
+                                                      bucket_name=self.db_name)
+        self.download_from_primary = download_db.read_preference == pymongo.ReadPreference.PRIMARY
 
     def __init__(self, username, password, server=None):
         """Creates a new instance of StorageClient.
@@ -55,6 +70,7 @@ class StorageClient():
             raise Exception("Server is not provided")
 
         self.server = server
+        self.routing = ReadRouting()
         self._login(username, password)
 
 
@@ -116,11 +132,35 @@ class StorageClient():
 
         with open(target_path, "wb") as target_file:
             try:
-                self.client_gfsbucket.download_to_stream(f_id, target_file)
+                self._download_to_stream(f_id, target_file)
                 return target_path
             except gridfs.errors.NoFile:
                 raise NoFile("Error: File", str(filename), "condn't been downloaded.")
 
+    def _download_to_stream(self, f_id, target_file):
+        """Downloads chunks using `download` read preference. Falls back
+        to primary when a secondary is unreachable or lags behind
+        (file is missing or incomplete there)
+
+        """
+
+        if self.download_from_primary:
+            return self.client_gfsbucket.download_to_stream(f_id, target_file)
+
+        try:
+            self.download_gfsbucket.download_to_stream(f_id, target_file)
+        except (gridfs.errors.NoFile, gridfs.errors.CorruptGridFile,
+                pymongo.errors.ConnectionFailure):
+            self.routing.record_fallback("download")
+            target_file.seek(0)
+            target_file.truncate()
+            self.client_gfsbucket.download_to_stream(f_id, target_file)
+
+    def routing_stats(self):
+        """Returns read routing metrics, see `ReadRouting.snapshot`"""
+
+        return self.routing.snapshot()
+
     def find_file(self, filepath):
         """Finds file and returns it's `ObjectID`.
 
@@ -152,6 +192,48 @@ class StorageClient():
 
         return self.client_gfsbucket.find( {"filename": filepath } )
 
+    def _find_filenames(self, condition, projection, limit):
+        if projection == None:
+            projection = {"filename": True}
+
+        query = {"filename": condition} if condition else {}
+        return self.client_files.find(query,
+                                       projection=projection,
+                                       limit=limit).sort("filename", 1)
+
+    def find_by_prefix(self, prefix, projection=None, limit=0):
+        """Returns a cursor over files (all revisions) whose path
+        starts with `prefix`, sorted by path.
+
+        Documents contain `_id` and `filename` unless `projection` is
+        given. `limit=0` means no limit. Empty `prefix` matches all
+        files.
+
+        """
+
+        if prefix != "":
+            prefix = normalize_filepath(prefix)
+
+        return self._find_filenames(prefix_range(prefix), projection, limit)
+
+    def glob(self, pattern, projection=None, limit=0):
+        """Returns a cursor over files (all revisions) matching glob
+        `pattern`, e.g. `/logs/2026-*/app*.gz`. See `glob_to_regex` for
+        syntax.
+
+        Literal prefix of the pattern is looked up as a `filename`
+        range, the rest is checked by an anchored regex. Arguments are
+        the same as for `find_by_prefix`
+
+        """
+
+        if pattern != "":
+            pattern = normalize_filepath(pattern)
+        condition = prefix_range(glob_prefix(pattern))
+        condition["$regex"] = glob_to_regex(pattern)
+
+        return self._find_filenames(condition, projection, limit)
+
     def rename(self, filepath, new_filepath):
         """Rename file at `filepath` to `new_filepath`
 
@@ -209,11 +291,14 @@ class StorageClient():
         Removes all contents of directory if `recursively=True`
         specified. Otherwise, raises an exception.
 
+        Returns a list of removed files (`GridOut`).
+
         """
 
         dirpath = normalize_dirpath(dirpath)
 
-        files_to_delete = list(self.find_several({'$regex': "^" + dirpath}))
+        files_to_delete = list(self.client_gfsbucket.find(
+            {"filename": prefix_range(dirpath)}))
 
         if not recursively and len(files_to_delete) > 1:
             raise Exception("Directory is not empty")
@@ -227,17 +312,18 @@ class StorageClient():
 
         dirpath = normalize_dirpath(dirpath)
         target_dirpath = normalize_dirpath(target_dirpath)
-        files = self.find_several({'$regex': "^" + dirpath})
+        files = list(self.find_by_prefix(dirpath))
         for f in files:
-            old_filename = self.client_gridfs.get(f._id).filename
-            new_filename = old_filename.replace(dirpath, target_dirpath, 1)
-            self.client_gfsbucket.rename(f._id, new_filename)
+            new_filename = f["filename"].replace(dirpath, target_dirpath, 1)
+            self.client_gfsbucket.rename(f["_id"], new_filename)
 
     def list_files(self, dirpath):
-        """List all files in provided path"""
+        """List all files in provided path, sorted by name"""
 
         dirpath = normalize_dirpath(dirpath)
-        return [file.filename for file in self.find_several({'$regex': "^" + dirpath + "(\w|\d)+/?$"})]
+        condition = prefix_range(dirpath)
+        condition["$regex"] = "^" + re.escape(dirpath) + "\\w+/?$"
+        return [file["filename"] for file in self._find_filenames(condition, None, 0)]
 
     # TODO: add optional parameter `do_actually_delete', defaults to `True'.
     # If False, then just mark file as deleted
@@ -1,14 +1,213 @@
 """Simple utils for PyStorage"""
 
+from pystorage.errors import ConfigError
+
+from pymongo import read_preferences
+
 from urllib.parse import quote_plus
 
+import re
+
+PRIMARY_ONLY = ("metadata",)
+
+READ_PREFERENCES = {
+    "primary": read_preferences.Primary,
+    "primaryPreferred": read_preferences.PrimaryPreferred,
+    "secondary": read_preferences.Secondary,
+    "secondaryPreferred": read_preferences.SecondaryPreferred,
+    "nearest": read_preferences.Nearest,
+}
+
+def hosts_string(config):
+    """Comma-separated list of hosts from `host` config value.
+
+    `host` may be a single "host[:port]" string or a list of them
+    (replica set members). Unix socket paths are percent-encoded
+
+    """
+
+    hosts = config["host"]
+    if not isinstance(hosts, (list, tuple)):
+        hosts = [hosts]
+
+    return ",".join(quote_plus(host) if host.endswith(".sock") else host
+                    for host in hosts)
+
+def server_selection_timeout(config):
+    """Server selection timeout (ms) for client.
+
+    1 for a single host, so wrong credentials or a dead server fail
+    fast. For a replica set it must outlast a primary election:
+    `server_selection_timeout_ms` config value, 30000 by default
+
+    """
+
+    if config.get("replica_set"):
+        return config.get("server_selection_timeout_ms", 30000)
+
+    return 1
+
+def uri_options(config):
+    """Query part of connection string, e.g. `?replicaSet=rs0`"""
+
+    if config.get("replica_set"):
+        return "?replicaSet=%s" % quote_plus(config["replica_set"])
+
+    return ""
+
 def connection_string(userinfo, config):
     """Mongo connection string for client"""
 
-    return ("mongodb://%s:%s@%s/%s" % (quote_plus(userinfo.username),
-                                       quote_plus(userinfo.password),
-                                       config["host"],
-                                       config["storage_db"])).format()
+    return "mongodb://%s:%s@%s/%s%s" % (quote_plus(userinfo.username),
+                                        quote_plus(userinfo.password),
+                                        hosts_string(config),
+                                        config["storage_db"],
+                                        uri_options(config))
+
+def read_preference(config, operation):
+    """Read preference for `operation` class (`metadata` or `download`).
+
+    Configured by optional `read_preference` section, defaults to
+    primary. `metadata` must stay primary, since write paths rely on
+    its lookups. `max_staleness` (seconds, -1 for no limit or at least
+    90) is applied to non-primary modes.
+
+    Raises `ConfigError` on unknown or disallowed mode or invalid
+    `max_staleness`
+
+    """
+
+    section = config.get("read_preference", {})
+    mode = section.get(operation, "primary")
+
+    try:
+        pref_class = READ_PREFERENCES[mode]
+    except KeyError:
+        raise ConfigError("Unknown read preference %r for %s." % (mode, operation))
+
+    if pref_class is read_preferences.Primary:
+        return pref_class()
+
+    if operation in PRIMARY_ONLY:
+        raise ConfigError("Read preference for %s must be primary, got %r."
+                          % (operation, mode))
+
+    max_staleness = section.get("max_staleness", -1)
+    if (not isinstance(max_staleness, int) or isinstance(max_staleness, bool)
+            or (max_staleness != -1 and max_staleness < 90)):
+        raise ConfigError("max_staleness must be -1 or an integer >= 90, got %r."
+                          % (max_staleness,))
+
+    return pref_class(max_staleness=max_staleness)
+
+GLOB_SPECIAL = "*?["
+
+def glob_prefix(pattern):
+    """Literal part of glob `pattern` before the first wildcard"""
+
+    for i, char in enumerate(pattern):
+        if char in GLOB_SPECIAL:
+            return pattern[:i]
+
+    return pattern
+
+def _class_escape(char):
+    return "\\" + char if char in "\\[]^-" else char
+
+def _class_items(chars):
+    """Escaped items of a glob character class, reversed ranges are
+    dropped
+
+    """
+
+    items = []
+    k = 0
+    while k < len(chars):
+        if k + 2 < len(chars) and chars[k + 1] == "-":
+            if chars[k] <= chars[k + 2]:
+                items.append(_class_escape(chars[k]) + "-" + _class_escape(chars[k + 2]))
+            k += 3
+        else:
+            items.append(_class_escape(chars[k]))
+            k += 1
+
+    return items
+
+def glob_to_regex(pattern):
+    """Translates glob `pattern` to an anchored regex over full path.
+
+    `*` and `?` don't match '/', `**` matches anything, `[...]`
+    (`[!...]` for negation) matches a character from a set except
+    '/', reversed ranges like `z-a` match nothing. All other
+    characters are escaped
+
+    """
+
+    res = ["^"]
+    i, n = 0, len(pattern)
+    while i < n:
+        char = pattern[i]
+        i += 1
+        if char == "*":
+            if i < n and pattern[i] == "*":
+                i += 1
+                res.append(".*")
+            else:
+                res.append("[^/]*")
+        elif char == "?":
+            res.append("[^/]")
+        elif char == "[":
+            j = i
+            if j < n and pattern[j] == "!":
+                j += 1
+            if j < n and pattern[j] == "]":
+                j += 1
+            end = pattern.find("]", j)
+            if end == -1:
+                res.append(re.escape(char))
+                continue
+            chars = pattern[i:end]
+            i = end + 1
+            negate = chars[0] == "!"
+            if negate:
+                chars = chars[1:]
+            items = _class_items(chars)
+            if not items:
+                # Only reversed ranges, like fnmatch: `[z-a]` matches
+                # nothing, `[!z-a]` any character
+                res.append("[^/]" if negate else "(?!)")
+                continue
+            # Lookahead keeps ranges like `[.-0]` from matching '/'
+            res.append("(?!/)[" + ("^" if negate else "") + "".join(items) + "]")
+        else:
+            res.append(re.escape(char))
+
+    res.append("$")
+    return "".join(res)
+
+def prefix_range(prefix):
+    """Index-friendly `filename` range `{"$gte": .., "$lt": ..}` matching
+    every string that starts with `prefix`
+
+    """
+
+    if prefix == "":
+        return {}
+
+    upper = prefix
+    while upper and ord(upper[-1]) == 0x10FFFF:
+        upper = upper[:-1]
+
+    if upper == "":
+        return { "$gte": prefix }
+
+    last = ord(upper[-1]) + 1
+    if 0xD800 <= last <= 0xDFFF:
+        # Surrogates can't be encoded to BSON
+        last = 0xE000
+
+    return { "$gte": prefix,
+             "$lt": upper[:-1] + chr(last) }
 
 def normalize_dirpath(dirpath):
     """Adds '/' at the beginning and at the end of dirpath string if